@@ -1,7 +1,25 @@
 import os
+import copy
+import json
+import argparse
+import queue
+import atexit
+import logging
+import re
+import math
+import time
+import asyncio
+import hashlib
+import sqlite3
+import functools
+import weakref
+import httpx
 import requests
-from typing import List, Dict
-from openai import OpenAI
+from typing import List, Dict, Optional, Callable
+from collections import Counter
+from logging.handlers import QueueHandler, QueueListener
+from openai import AsyncOpenAI
+from openai.types.chat import ChatCompletion
 from judgeval.tracer import Tracer, wrap
 from judgeval import JudgmentClient
 from judgeval.data import Example
@@ -15,55 +33,285 @@ from judgeval.scorers import FaithfulnessScorer, AnswerRelevancyScorer
 # Or load from environment variables set in terminal
 # Keys should be set via: export JUDGMENT_API_KEY="..." etc.
 
+# Models used for planning/analysis/evaluation and for the final synthesis
+MODEL = os.getenv("RESEARCH_MODEL", "gpt-4o-mini")
+SYNTHESIS_MODEL = os.getenv("RESEARCH_SYNTHESIS_MODEL", MODEL)
+
+# System prompts are kept byte-for-byte constant so OpenAI's prompt caching
+# can reuse the shared prefix; per-call details go in the user message.
+PLANNER_SYSTEM_PROMPT = "You are a research coordinator. Break down complex research questions into 3 specific subtopics for specialized agents. Return JSON {\"subtopics\": [s1, s2, s3]}."
+RESEARCH_SYSTEM_PROMPT = "You are a research agent specializing in the topic given by the user. Provide detailed analysis based on the search results."
+BATCH_RESEARCH_SYSTEM_PROMPT = "You are a team of research agents, each specializing in one topic. Provide detailed analysis of every topic based on its search results. Respond in JSON as {\"analyses\": [{\"topic\": ..., \"findings\": ...}]} with one entry per topic, in the given order."
+SYNTHESIS_SYSTEM_PROMPT = "You are a senior researcher. Synthesize multiple research findings into a comprehensive report."
+
+class _LevelIconFormatter(logging.Formatter):
+    """Prefix each log line with an icon for its level"""
+    ICONS = {logging.INFO: "🔹", logging.WARNING: "⚠️", logging.ERROR: "❌"}
+
+    def format(self, record: logging.LogRecord) -> str:
+        return f"{self.ICONS.get(record.levelno, '')} {super().format(record)}"
+
+# QueueHandler merges each message's arguments in the calling thread and only
+# enqueues the record; a background listener adds the icon and writes to
+# stderr, so agents never block on terminal writes
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+logger.propagate = False
+_log_queue = queue.Queue(-1)
+logger.addHandler(QueueHandler(_log_queue))
+_log_handler = logging.StreamHandler()
+_log_handler.setFormatter(_LevelIconFormatter())
+_log_listener = QueueListener(_log_queue, _log_handler)
+_log_listener.start()
+atexit.register(_log_listener.stop)
+
 # Initialize Judgeval components
-client = wrap(OpenAI())
 judgment = Tracer(project_name="multi_agent_research_v2")  # Try a new project name
 eval_client = JudgmentClient()
 
+# Pooled connections are tied to the event loop that opened them, so each loop
+# gets its own HTTP pool and OpenAI client, created on first use
+_loop_clients = weakref.WeakKeyDictionary()
+
+def _clients_for_loop():
+    loop = asyncio.get_running_loop()
+    if loop not in _loop_clients:
+        http = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=20),
+            timeout=60
+        )
+        _loop_clients[loop] = (http, wrap(AsyncOpenAI(http_client=http)))
+    return _loop_clients[loop]
+
+def get_http_client() -> httpx.AsyncClient:
+    """Shared HTTP connection pool for outbound calls on the running loop"""
+    return _clients_for_loop()[0]
+
+def get_openai_client() -> AsyncOpenAI:
+    """Traced OpenAI client that shares the running loop's connection pool"""
+    return _clients_for_loop()[1]
+
+async def close_http_client():
+    """Close the running loop's connection pool; later calls open a fresh one"""
+    clients = _loop_clients.pop(asyncio.get_running_loop(), None)
+    if clients:
+        await clients[0].aclose()
+
+class CachedChatClient:
+    """Persistent cache in front of chat completion calls.
+
+    Responses are keyed on a SHA-256 of the request parameters and stored in
+    SQLite so repeated runs skip the OpenAI round-trip. Entries expire after
+    `ttl` seconds and the least recently used ones are evicted beyond
+    `max_entries`. Only `temperature=0` requests are cached; sampled and
+    streaming requests always go to the API.
+    """
+
+    def __init__(self, get_client: Callable[[], AsyncOpenAI], path: str = ".llm_cache.db",
+                 ttl: float = 24 * 3600, max_entries: int = 500):
+        self.get_client = get_client
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.db = sqlite3.connect(path)
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS completions (key TEXT PRIMARY KEY, response TEXT, created REAL, accessed REAL)"
+        )
+        self.db.commit()
+
+    @staticmethod
+    def _key(params: Dict) -> str:
+        return hashlib.sha256(json.dumps(params, sort_keys=True).encode()).hexdigest()
+
+    async def create(self, **params) -> ChatCompletion:
+        # Only deterministic (temperature=0) requests are replayed from the cache
+        cacheable = not params.get("stream") and params.get("temperature") == 0
+        
+        if cacheable:
+            key = self._key(params)
+            now = time.time()
+            row = self.db.execute("SELECT response, created FROM completions WHERE key = ?", (key,)).fetchone()
+            if row and now - row[1] < self.ttl:
+                self.db.execute("UPDATE completions SET accessed = ? WHERE key = ?", (now, key))
+                self.db.commit()
+                return ChatCompletion.model_validate(json.loads(row[0]))
+        
+        response = await self.get_client().chat.completions.create(**params)
+        if params.get("stream"):
+            return response
+        
+        details = getattr(response.usage, "prompt_tokens_details", None)
+        if details and details.cached_tokens:
+            logger.info("Prompt cache hit: %d/%d tokens", details.cached_tokens, response.usage.prompt_tokens)
+        
+        if cacheable:
+            self.db.execute(
+                "INSERT OR REPLACE INTO completions VALUES (?, ?, ?, ?)",
+                (key, response.model_dump_json(), now, now)
+            )
+            # Drop expired entries, then evict least recently used beyond the limit
+            self.db.execute("DELETE FROM completions WHERE created < ?", (now - self.ttl,))
+            self.db.execute(
+                "DELETE FROM completions WHERE key NOT IN "
+                "(SELECT key FROM completions ORDER BY accessed DESC LIMIT ?)",
+                (self.max_entries,)
+            )
+            self.db.commit()
+        return response
+
+llm = CachedChatClient(get_openai_client)
+
+@functools.lru_cache(maxsize=1024)
+def _web_search_impl(query: str) -> tuple:
+    """Build (results, sources) for a query; memoized since it is deterministic"""
+    # For demo purposes, return mock data
+    results = (
+        f"Research finding about {query} from source 1",
+        f"Additional information on {query} from source 2",
+        f"Expert analysis of {query} from source 3"
+    )
+    sources = ("source1.com", "source2.org", "source3.edu")
+    return results, sources
+
+def _parse_subtopics(content: str) -> List[str]:
+    """Extract up to 3 subtopic strings from the planner's JSON reply"""
+    plan = json.loads(content)
+    items = plan.get("subtopics") if isinstance(plan, dict) else None
+    if not isinstance(items, list):
+        return []
+    
+    subtopics = []
+    for item in items:
+        # Models sometimes return {"title": ...} objects instead of strings
+        if isinstance(item, dict):
+            item = item.get("title")
+        if isinstance(item, str) and item.strip():
+            subtopics.append(item.strip())
+    return subtopics[:3]
+
+def _findings_text(findings) -> Optional[str]:
+    """Normalize a batched analysis' findings to text, or None if unusable"""
+    # Bullet-style answers come back as a list of strings
+    if isinstance(findings, list) and all(isinstance(item, str) for item in findings):
+        findings = "\n".join(findings)
+    if isinstance(findings, str) and findings.strip():
+        return findings
+    return None
+
+def _split_sentences(text: str) -> List[str]:
+    """Split text into sentences and list items"""
+    sentences = []
+    for line in text.splitlines():
+        enumerator = ""
+        for piece in re.split(r'(?<=[.!?])\s+', line.strip()):
+            # Keep list markers like "2." attached to the item they number
+            if re.fullmatch(r'\d+\.', piece):
+                enumerator += piece + " "
+                continue
+            if piece:
+                sentences.append(enumerator + piece)
+            enumerator = ""
+        if enumerator:
+            sentences.append(enumerator.strip())
+    return sentences
+
+def _trim(text: str, reference: str, k: int = 5) -> str:
+    """Keep the k sentences of text most relevant to reference, in original order"""
+    sentences = _split_sentences(text)
+    if len(sentences) <= k:
+        return text
+    
+    # TF-IDF over the sentences so words shared by every sentence count for little
+    words = [set(re.findall(r"\w+", sentence.lower())) for sentence in sentences]
+    doc_freq = Counter(word for sentence_words in words for word in sentence_words)
+    reference_words = set(re.findall(r"\w+", reference.lower()))
+    scores = [
+        sum(math.log((1 + len(sentences)) / (1 + doc_freq[word])) + 1 for word in sentence_words & reference_words)
+        for sentence_words in words
+    ]
+    
+    top = sorted(range(len(sentences)), key=lambda i: scores[i], reverse=True)[:k]
+    return " ".join(sentences[i] for i in sorted(top))
+
 class MultiAgentResearchSystem:
-    def __init__(self):
-        self.research_database = []
+    def __init__(self, batch_agents: bool = True, db_path: str = "research.db", report_ttl: float = 3600,
+                 quorum: Optional[int] = None):
+        if quorum is not None and quorum < 1:
+            raise ValueError(f"quorum must be at least 1, got {quorum}")
+        
+        # Findings are appended to SQLite rather than kept in memory
+        self.research_database = sqlite3.connect(db_path)
+        self.research_database.execute(
+            "CREATE TABLE IF NOT EXISTS research (agent_id INTEGER, topic TEXT, findings TEXT, sources TEXT, search_query TEXT)"
+        )
+        self.research_database.commit()
+        # Analyze all subtopics in one LLM request instead of one per agent
+        self.batch_agents = batch_agents
+        # With per-agent fan-out, synthesize once this many agents have succeeded
+        self.quorum = quorum
+        # Completed reports keyed by question hash, reused for repeat questions
+        self.report_ttl = report_ttl
+        self._question_cache = {}
         
     @judgment.observe(span_type="tool")
-    def web_search(self, query: str) -> Dict:
+    async def web_search(self, query: str) -> Dict:
         """Simulate web search - replace with real Tavily API call"""
-        # For demo purposes, return mock data
-        # In real implementation, use Tavily API
-        mock_results = {
+        # A real Tavily call has to be awaited here, and lru_cache can't memoize
+        # coroutines; cache it with a dict of asyncio.Task keyed on the query
+        # instead, so concurrent duplicate queries share one request.
+        results, sources = _web_search_impl(query)
+        # Build fresh lists so callers can't mutate the cached entry
+        return {
             "query": query,
-            "results": [
-                f"Research finding about {query} from source 1",
-                f"Additional information on {query} from source 2",
-                f"Expert analysis of {query} from source 3"
-            ],
-            "sources": ["source1.com", "source2.org", "source3.edu"]
+            "results": list(results),
+            "sources": list(sources)
         }
-        return mock_results
     
     @judgment.observe(span_type="tool")
     def store_research(self, data: Dict) -> bool:
         """Store research findings in database"""
-        self.research_database.append(data)
-        print(f"📝 Stored research: {data['topic']}")
+        self.research_database.execute(
+            "INSERT INTO research VALUES (?, ?, ?, ?, ?)",
+            (data["agent_id"], data["topic"], data["findings"], json.dumps(data["sources"]), data["search_query"])
+        )
+        self.research_database.commit()
+        logger.info("Stored research: %s", data["topic"])
         return True
     
+    def recent_research(self, n: int = 10) -> List[Dict]:
+        """Return the n most recently stored research findings"""
+        rows = self.research_database.execute(
+            "SELECT agent_id, topic, findings, sources, search_query FROM research ORDER BY rowid DESC LIMIT ?",
+            (n,)
+        ).fetchall()
+        return [
+            {
+                "agent_id": agent_id,
+                "topic": topic,
+                "findings": findings,
+                "sources": json.loads(sources),
+                "search_query": search_query
+            }
+            for agent_id, topic, findings, sources, search_query in rows
+        ]
+    
     @judgment.observe(span_type="function")
-    def research_agent(self, topic: str, agent_id: int) -> Dict:
+    async def research_agent(self, topic: str, agent_id: int) -> Dict:
         """Individual research agent that focuses on specific topic"""
-        print(f"🔍 Agent {agent_id} researching: {topic}")
+        logger.info("Agent %d researching: %s", agent_id, topic)
         
         try:
             # Conduct web search
-            search_results = self.web_search(f"{topic} research analysis")
+            search_results = await self.web_search(f"{topic} research analysis")
             
             # Generate research summary using LLM
-            response = client.chat.completions.create(
-                model="gpt-3.5-turbo",
+            response = await llm.create(
+                model=MODEL,
                 messages=[
-                    {"role": "system", "content": f"You are a research agent specializing in {topic}. Provide detailed analysis based on the search results."},
-                    {"role": "user", "content": f"Analyze this research data: {search_results['results']}"}
+                    {"role": "system", "content": RESEARCH_SYSTEM_PROMPT},
+                    {"role": "user", "content": f"Topic: {topic}\n\nAnalyze this research data: {search_results['results']}"}
                 ],
-                max_tokens=300
+                max_tokens=300,
+                temperature=0
             )
             
             if response and response.choices:
@@ -85,69 +333,190 @@ class MultiAgentResearchSystem:
             return research_data
             
         except Exception as e:
-            print(f"⚠️ Research agent {agent_id} failed: {e}")
+            logger.warning("Research agent %d failed: %s", agent_id, e)
             return {
                 "agent_id": agent_id,
                 "topic": topic,
                 "findings": f"Research failed: {str(e)}",
                 "sources": [],
-                "search_query": topic
+                "search_query": topic,
+                "error": str(e)
             }
     
-    def lead_agent(self, research_question: str) -> Dict:
-        """Lead agent that coordinates research and synthesizes findings"""
-        print(f"🎯 Lead Agent starting research on: {research_question}")
+    @judgment.observe(span_type="function")
+    def record_agent_research(self, topic: str, agent_id: int, findings: str, search_results: Dict) -> Dict:
+        """Record one agent's share of a batched research request"""
+        research_data = {
+            "agent_id": agent_id,
+            "topic": topic,
+            "findings": findings,
+            "sources": search_results["sources"],
+            "search_query": search_results["query"]
+        }
+        self.store_research(research_data)
+        return research_data
+    
+    @judgment.observe(span_type="function")
+    async def batch_research_agent(self, subtopics: List[str]) -> List[Dict]:
+        """Research all subtopics with a single batched LLM request"""
+        logger.info("Agents 1-%d researching (batched): %s", len(subtopics), subtopics)
+        
+        search_results = await asyncio.gather(
+            *[self.web_search(f"{topic} research analysis") for topic in subtopics]
+        )
+        
+        analyses = []
+        try:
+            response = await llm.create(
+                model=MODEL,
+                messages=[
+                    {"role": "system", "content": BATCH_RESEARCH_SYSTEM_PROMPT},
+                    {"role": "user", "content": f"Analyze this research data: {json.dumps([{'topic': topic, 'results': search['results']} for topic, search in zip(subtopics, search_results)])}"}
+                ],
+                response_format={"type": "json_object"},
+                max_tokens=300 * len(subtopics),
+                temperature=0
+            )
+            
+            if response and response.choices:
+                parsed = json.loads(response.choices[0].message.content)
+                analyses = parsed.get("analyses") if isinstance(parsed, dict) else None
+                # Keep only well-formed entries; anything else is retried per agent
+                if not isinstance(analyses, list):
+                    analyses = []
+                analyses = [a if isinstance(a, dict) else {} for a in analyses]
+        except Exception as e:
+            logger.warning("Batched research failed: %s", e)
+        
+        # Match analyses back to topics by name, falling back to position
+        by_topic = {
+            a["topic"]: _findings_text(a.get("findings"))
+            for a in analyses if isinstance(a.get("topic"), str)
+        }
+        research_results = []
+        missing = []
+        for i, (topic, search) in enumerate(zip(subtopics, search_results)):
+            findings = by_topic.get(topic)
+            # Fall back to position only if that entry isn't another subtopic's analysis
+            if not findings and i < len(analyses) and analyses[i].get("topic") not in subtopics:
+                findings = _findings_text(analyses[i].get("findings"))
+            if findings:
+                research_results.append(self.record_agent_research(topic, i+1, findings, search))
+            else:
+                missing.append((i+1, topic))
+        
+        # Topics the batched response dropped get their own agent call
+        if missing:
+            logger.warning("Batched response missing %d topic(s), retrying individually", len(missing))
+            research_results.extend(await asyncio.gather(
+                *[self.research_agent(topic, agent_id=agent_id) for agent_id, topic in missing]
+            ))
+            research_results.sort(key=lambda r: r["agent_id"])
+        
+        return research_results
+    
+    async def lead_agent(self, research_question: str, on_token: Optional[Callable[[str], None]] = None) -> Dict:
+        """Lead agent that coordinates research and synthesizes findings.
+
+        If given, `on_token` is called with each synthesis token as it streams in.
+        """
+        logger.info("Lead Agent starting research on: %s", research_question)
+        
+        question_key = hashlib.sha256(research_question.encode()).hexdigest()
+        cached = self._question_cache.get(question_key)
+        if cached and time.time() - cached[0] < self.report_ttl:
+            logger.info("Reusing report from a previous run of this question")
+            return copy.deepcopy(cached[1])
         
         try:
             # Break down research question into subtopics
-            planning_response = client.chat.completions.create(
-                model="gpt-3.5-turbo",
+            planning_response = await llm.create(
+                model=MODEL,
                 messages=[
-                    {"role": "system", "content": "You are a research coordinator. Break down complex research questions into 3 specific subtopics for specialized agents."},
+                    {"role": "system", "content": PLANNER_SYSTEM_PROMPT},
                     {"role": "user", "content": f"Break down this research question into 3 subtopics: {research_question}"}
                 ],
-                max_tokens=200
+                response_format={"type": "json_object"},
+                max_tokens=200,
+                temperature=0
             )
             
+            subtopics = []
             if planning_response and planning_response.choices:
-                subtopics_text = planning_response.choices[0].message.content
-                # Simple parsing - in real implementation, use better parsing
-                subtopics = [topic.strip() for topic in subtopics_text.split('\n') if topic.strip() and not topic.strip().startswith('#')][:3]
-            else:
-                subtopics = []
+                try:
+                    subtopics = _parse_subtopics(planning_response.choices[0].message.content)
+                except (json.JSONDecodeError, TypeError) as e:
+                    logger.warning("Could not parse research plan: %s", e)
             
             # Fallback if parsing fails
             if not subtopics:
                 subtopics = ["Technical challenges", "Economic factors", "Policy considerations"]
             
-            print(f"📋 Research plan: {subtopics}")
+            logger.info("Research plan: %s", subtopics)
             
-            # Delegate to research agents (simulate parallel execution)
-            research_results = []
-            for i, subtopic in enumerate(subtopics):
-                try:
-                    result = self.research_agent(subtopic, agent_id=i+1)
-                    research_results.append(result)
-                except Exception as e:
-                    print(f"⚠️ Agent {i+1} failed: {e}")
-                    # Continue with other agents
-                    pass
+            if self.batch_agents:
+                research_results = await self.batch_research_agent(subtopics)
+            else:
+                # Delegate to research agents concurrently
+                tasks = {
+                    asyncio.ensure_future(self.research_agent(subtopic, agent_id=i+1)): i+1
+                    for i, subtopic in enumerate(subtopics)
+                }
+                
+                research_results = []
+                succeeded = 0
+                pending = set(tasks)
+                # Failed agents are kept for the report but don't count toward the quorum
+                while pending and not (self.quorum and succeeded >= self.quorum):
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        if task.exception():
+                            logger.warning("Agent %d failed: %s", tasks[task], task.exception())
+                            # Continue with other agents
+                            continue
+                        research_results.append(task.result())
+                        if "error" not in task.result():
+                            succeeded += 1
+                
+                # Don't wait on slow agents once the quorum is met
+                for task in pending:
+                    task.cancel()
+                if pending:
+                    logger.info("Quorum of %d reached, cancelled %d slower agent(s)", self.quorum, len(pending))
+                research_results.sort(key=lambda r: r["agent_id"])
             
             # Synthesize final report
+            synthesized = False
             if research_results:
-                all_findings = "\n".join([r["findings"] for r in research_results])
+                # Pass each agent's findings as its own turn rather than one joined blob
+                messages = [
+                    {"role": "system", "content": SYNTHESIS_SYSTEM_PROMPT},
+                    {"role": "user", "content": f"Original question: {research_question}"}
+                ] + [
+                    {"role": "user", "content": f"Source {i+1} ({r['topic']}): {r['findings']}"}
+                    for i, r in enumerate(research_results)
+                ] + [
+                    {"role": "user", "content": "Create a comprehensive synthesis."}
+                ]
                 
-                synthesis_response = client.chat.completions.create(
-                    model="gpt-3.5-turbo",
-                    messages=[
-                        {"role": "system", "content": "You are a senior researcher. Synthesize multiple research findings into a comprehensive report."},
-                        {"role": "user", "content": f"Original question: {research_question}\n\nResearch findings:\n{all_findings}\n\nCreate a comprehensive synthesis."}
-                    ],
-                    max_tokens=500
+                synthesis_response = await llm.create(
+                    model=SYNTHESIS_MODEL,
+                    messages=messages,
+                    max_tokens=500,
+                    stream=True
                 )
                 
-                if synthesis_response and synthesis_response.choices:
-                    final_synthesis = synthesis_response.choices[0].message.content
+                # Hand tokens out as they arrive instead of waiting for the full report
+                chunks = []
+                async for chunk in synthesis_response:
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        chunks.append(chunk.choices[0].delta.content)
+                        if on_token:
+                            on_token(chunk.choices[0].delta.content)
+                
+                if chunks:
+                    final_synthesis = "".join(chunks)
+                    synthesized = True
                 else:
                     final_synthesis = f"Synthesis of research on: {research_question}\n\nBased on findings from {len(research_results)} research agents."
             else:
@@ -161,10 +530,14 @@ class MultiAgentResearchSystem:
                 "total_agents_used": len(research_results)
             }
             
+            # Only reuse reports built from at least one successful agent and a real synthesis
+            if synthesized and any("error" not in r for r in research_results):
+                self._question_cache[question_key] = (time.time(), copy.deepcopy(final_report))
+            
             return final_report
             
         except Exception as e:
-            print(f"⚠️ Lead agent failed: {e}")
+            logger.warning("Lead agent failed: %s", e)
             # Return minimal report instead of None
             return {
                 "research_question": research_question,
@@ -176,13 +549,14 @@ class MultiAgentResearchSystem:
     
     def evaluate_research_quality(self, report: Dict) -> Dict:
         """Evaluate the quality of research using Judgeval"""
-        print("🧪 Evaluating research quality...")
+        logger.info("Evaluating research quality...")
         
         # Create evaluation example
         example = Example(
             input=report["research_question"],
             actual_output=report["final_synthesis"],
-            retrieval_context=[r["findings"] for r in report["individual_research"]]
+            # Rank context against the synthesis so the sentences it relied on survive
+            retrieval_context=[_trim(r["findings"], report["final_synthesis"]) for r in report["individual_research"]]
         )
         
         # Set up scorers
@@ -196,7 +570,7 @@ class MultiAgentResearchSystem:
             results = eval_client.run_evaluation(
                 examples=[example],
                 scorers=scorers,
-                model="gpt-3.5-turbo",
+                model=MODEL,
                 project_name="multi_agent_research_eval"
             )
             
@@ -209,42 +583,72 @@ class MultiAgentResearchSystem:
             return evaluation_summary
             
         except Exception as e:
-            print(f"Evaluation error: {e}")
+            logger.warning("Evaluation error: %s", e)
             return {"evaluation_success": False, "error": str(e)}
 
-def main():
+async def main(batch_agents: bool = True, quorum: Optional[int] = None):
     """Main function to run the research system"""
-    system = MultiAgentResearchSystem()
+    try:
+        system = MultiAgentResearchSystem(batch_agents=batch_agents, quorum=quorum)
+    
+        # Example research question
+        research_question = "What are the main challenges and opportunities for renewable energy adoption in developing countries?"
     
-    # Example research question
-    research_question = "What are the main challenges and opportunities for renewable energy adoption in developing countries?"
+        print("🚀 Starting Multi-Agent Research System")
+        print("=" * 50)
     
-    print("🚀 Starting Multi-Agent Research System")
-    print("=" * 50)
+        # Run the research, printing the synthesis as it streams in
+        streamed = []
+        def print_token(token: str):
+            if not streamed:
+                print("\n📝 Final Synthesis:")
+            streamed.append(token)
+            print(token, end="", flush=True)
     
-    # Run the research
-    report = system.lead_agent(research_question)
+        report = await system.lead_agent(research_question, on_token=print_token)
+        if streamed:
+            print()
     
-    print("\n📊 Research Complete!")
-    print("=" * 50)
-    print(f"Question: {report['research_question']}")
-    print(f"Agents Used: {report['total_agents_used']}")
-    print(f"Subtopics: {report['subtopics']}")
-    print("\n📝 Final Synthesis:")
-    print(report['final_synthesis'])
+        # Hand the evaluation to a worker thread right away so it runs while the
+        # summary below is printed; run_in_executor submits it immediately,
+        # whereas a task would not start until the loop next regains control
+        eval_future = asyncio.get_running_loop().run_in_executor(None, system.evaluate_research_quality, report)
     
-    # Evaluate the research
-    evaluation = system.evaluate_research_quality(report)
+        print("\n📊 Research Complete!")
+        print("=" * 50)
+        print(f"Question: {report['research_question']}")
+        print(f"Agents Used: {report['total_agents_used']}")
+        print(f"Subtopics: {report['subtopics']}")
+        # Reused, fallback and error reports were not streamed
+        if "".join(streamed) != report["final_synthesis"]:
+            print("\n📝 Final Synthesis:")
+            print(report['final_synthesis'])
     
-    print("\n🧪 Evaluation Results:")
-    print("=" * 50)
-    if evaluation["evaluation_success"]:
-        for scorer_name, score in evaluation["scores"].items():
-            print(f"{scorer_name}: {score}")
-    else:
-        print(f"Evaluation failed: {evaluation.get('error', 'Unknown error')}")
+        # Wait for the evaluation only once the report is out
+        evaluation = await eval_future
     
-    return report, evaluation
+        print("\n🧪 Evaluation Results:")
+        print("=" * 50)
+        if evaluation["evaluation_success"]:
+            for scorer_name, score in evaluation["scores"].items():
+                print(f"{scorer_name}: {score}")
+        else:
+            print(f"Evaluation failed: {evaluation.get('error', 'Unknown error')}")
+    
+        return report, evaluation
+    finally:
+        await close_http_client()
 
 if __name__ == "__main__":
-    report, evaluation = main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Run the multi-agent research system")
+    parser.add_argument("--fan-out", action="store_true",
+                        help="run one LLM request per agent instead of a single batched request")
+    parser.add_argument("--quorum", type=int, default=None,
+                        help="synthesize as soon as this many agents succeed (implies --fan-out)")
+    args = parser.parse_args()
+    if args.quorum is not None and args.quorum < 1:
+        parser.error("--quorum must be at least 1")
+    
+    # A quorum only applies to per-agent requests, so it implies --fan-out
+    batch_agents = not args.fan_out and args.quorum is None
+    report, evaluation = asyncio.run(main(batch_agents=batch_agents, quorum=args.quorum))
\ No newline at end of file